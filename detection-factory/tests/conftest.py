@@ -0,0 +1,17 @@
+import sys
+import types
+
+try:
+    import detectionfactory.inference  # noqa: F401
+except ImportError:
+    # aiv-detection-factory comes from a private index, its contracts are
+    # plain dicts so they are stubbed with dict
+    inference = types.ModuleType("detectionfactory.inference")
+    for name in ("Point", "Polygon", "Prediction",
+                 "InferenceFrameData", "InferencePredictionData"):
+        setattr(inference, name, dict)
+
+    detectionfactory = types.ModuleType("detectionfactory")
+    detectionfactory.inference = inference
+    sys.modules["detectionfactory"] = detectionfactory
+    sys.modules["detectionfactory.inference"] = inference
@@ -0,0 +1,102 @@
+import sys
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from yolov5.yolo import YOLOv5
+
+# Box returned for every image, in letterboxed batch coordinates
+BOX = [10.0, 20.0, 110.0, 220.0, 0.9, 0.0]
+
+
+class DetectMultiBackend(torch.nn.Module):
+    """ Returns [pred, [feature maps]] like YOLOv5 in eval mode """
+
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+
+    def forward(self, x):
+        pred = torch.tensor([[BOX]]).expand(x.shape[0], 1, 6)
+        pred = pred + self.weight * x.mean()
+
+        return [pred, [x[:, :1], x[:, 1:2]]]
+
+
+class AutoShape(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.model = DetectMultiBackend()
+        self.names = {0: "person"}
+        self.stride = 32
+        self.classes = None
+        self.conf = 0.25
+        self.iou = 0.45
+        self.agnostic = False
+        self.max_det = 1000
+
+
+@pytest.fixture(autouse=True)
+def hub(monkeypatch):
+    general = types.ModuleType("utils.general")
+    general.non_max_suppression = lambda pred, **kwargs: list(pred)
+    utils = types.ModuleType("utils")
+    utils.general = general
+    monkeypatch.setitem(sys.modules, "utils", utils)
+    monkeypatch.setitem(sys.modules, "utils.general", general)
+    monkeypatch.setattr(torch.hub, "load", lambda *args, **kwargs: AutoShape())
+
+
+def _frame(h, w):
+    ok, jpeg = cv2.imencode(".jpg", np.zeros((h, w, 3), dtype=np.uint8))
+    assert ok
+
+    return {"frame": jpeg.tobytes(), "newFrameData": {}}
+
+
+def test_trace_built_at_load():
+    model = YOLOv5(img_size=64, frame_size=[90, 160])
+
+    assert model._traced is not None
+    assert model._batch_shape == (1, 3, 64, 64)
+
+
+def test_boxes_scaled_back_to_frame():
+    model = YOLOv5(img_size=64, frame_size=[90, 160])
+
+    predictions_data = model([_frame(90, 160)])
+
+    # 90x160 frames are resized by 0.4 to 36x64 and padded 14px on top
+    coordinates = predictions_data[0]["predictions"][0]["boundingBox"]["coordinates"]
+    assert coordinates[0] == {"x": pytest.approx(25.0), "y": pytest.approx(15.0)}
+    assert coordinates[2] == {"x": pytest.approx(160.0), "y": pytest.approx(90.0)}
+    assert predictions_data[0]["predictions"][0]["classId"] == "person"
+
+
+def test_trace_sized_from_first_batch():
+    model = YOLOv5(img_size=64)
+
+    assert model._traced is None
+
+    model([_frame(60, 160)])
+
+    # 60x160 frames are resized to 24x64, padded to the 32px stride
+    assert model._batch_shape == (1, 3, 32, 64)
+    assert model._traced is not None
+
+
+def test_no_padding_without_trace(monkeypatch):
+    def trace(*args, **kwargs):
+        raise RuntimeError("not traceable")
+
+    monkeypatch.setattr(torch.jit, "trace", trace)
+    model = YOLOv5(img_size=64, max_batch=4, frame_size=[64, 64])
+
+    model([_frame(60, 160)])
+
+    assert model._traced is None
+    assert tuple(model._batch_buf.shape) == (1, 3, 32, 64)
@@ -13,7 +13,10 @@ ai_cfg = json.loads(json.loads(cfg.ai))
 model = YOLOv5(model_size=ai_cfg["model_size"],
                img_size=ai_cfg["img_size"],
                classes=ai_cfg["classes"],
-               conf=ai_cfg["conf_thres"])
+               conf=ai_cfg["conf_thres"],
+               frame_skip=ai_cfg.get("frame_skip", 0),
+               max_batch=ai_cfg.get("max_batch", 1),
+               frame_size=ai_cfg.get("frame_size"))
 
 df = DetectionFactory(cfg.library, model)
 
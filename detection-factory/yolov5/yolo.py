@@ -1,9 +1,17 @@
+import os
+import copy
+import math
+import logging
 import torch
+import torchvision
 import numpy as np
 import cv2
-from torchvision.io import decode_image, ImageReadMode
+import torch.nn.functional as F
+from packaging import version
+from torchvision.io import decode_jpeg, ImageReadMode
 from torchvision.transforms import Resize
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from detectionfactory.inference import (Point,
                                         Polygon,
                                         Prediction,
@@ -11,6 +19,27 @@ from detectionfactory.inference import (Point,
                                         InferencePredictionData)
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+torch.backends.cudnn.benchmark = True
+# decode_jpeg accepts a list of images since torchvision 0.19
+BATCHED_DECODE = (version.parse(torchvision.__version__).release
+                  >= version.parse("0.19").release)
+
+
+class InferenceOutput(torch.nn.Module):
+    """
+    Keeps only the inference output of the wrapped DetectMultiBackend. In
+    eval mode it also returns the feature maps, a list mixing a Tensor with a
+    List[Tensor] that torch.jit.trace cannot trace.
+    """
+
+    def __init__(self, model: torch.nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        y = self.model(x)
+
+        return y[0] if isinstance(y, (list, tuple)) else y
 
 
 class YOLOv5():
@@ -18,7 +47,10 @@ class YOLOv5():
                  model_size="yolov5m",
                  img_size=640,
                  conf=0.25,
-                 classes=None) -> None:
+                 classes=None,
+                 frame_skip=0,
+                 max_batch=1,
+                 frame_size=None) -> None:
         """
         Wrapper to the YOLOv5 Model.
 
@@ -27,6 +59,12 @@ class YOLOv5():
             img_size: inference size h,w
             conf: confidence threshold
             classes (list or None): interest classes
+            frame_skip: frames skipped between two inferred frames, skipped
+                frames are never decoded and repeat the last predictions
+            max_batch: largest number of frames inferred at once
+            frame_size (list or None): camera frames h,w, used to trace and
+                warm up the model at load, otherwise it is traced for the
+                shape of the first batch
         """
         self.model = torch.hub.load("ultralytics/yolov5",
                                     model=model_size,
@@ -35,28 +73,75 @@ class YOLOv5():
             self.model.classes = [int(c) for c in classes.keys()]
 
         self.model.conf = conf
-        self.model.amp = True
+        names = self.model.names
+        self._names = list(names.values() if isinstance(names, dict) else names)
         self.model.to(DEVICE)
+        self.model.eval()
+
+        # Half precision pays off from Volta (compute capability 7.x) onwards
+        self.half = (DEVICE.type == "cuda"
+                     and torch.cuda.get_device_capability(DEVICE)[0] >= 7)
+        if self.half:
+            self.model.model.half()
+
+        # AutoShape letterboxes each image in Python on the host, so the
+        # wrapped DetectMultiBackend is called directly with a device batch
+        self.inner = InferenceOutput(self.model.model)
+        self.stride = int(torch.as_tensor(self.model.stride).max())
+        # torch.hub leaves the loaded repo modules in sys.modules, so its NMS
+        # can be imported once the model is loaded
+        from utils.general import non_max_suppression
+        self._nms = non_max_suppression
+        self._batch_buf = None
+
+        # Host frames are staged in pinned memory and uploaded on a side stream
+        self._copy_stream = (torch.cuda.Stream(DEVICE)
+                             if DEVICE.type == "cuda" else None)
+        self._pinned = torch.empty(0, dtype=torch.uint8)
+        self._copy_done = None
+
+        # Host decoding releases the GIL, so CPU frames are decoded in parallel
+        self._decode_pool = (ThreadPoolExecutor(max_workers=os.cpu_count())
+                             if DEVICE.type == "cpu" else None)
 
         self.img_size = int(img_size)
 
-    def _yolo_output_to_predictions(self, results) -> List[Prediction]:
-        """ Converts YOLOv5 Detections to AIV Prediction """
+        self.max_batch = int(max_batch)
+        if self.max_batch < 1:
+            raise ValueError(f"max_batch must be >= 1, got {max_batch}")
+
+        self.frame_skip = int(frame_skip)
+        if self.frame_skip < 0:
+            raise ValueError(f"frame_skip must be >= 0, got {frame_skip}")
+        self._frame_count = 0
+        self._last_predictions = []
+
+        # Batches that fit are padded to this fixed shape, the only one traced
+        self._batch_shape = None
+        self._traced = None
+
+        if frame_size:
+            frame_h, frame_w = frame_size
+            ratio = self.img_size / max(frame_h, frame_w)
+            with torch.inference_mode():
+                self._trace(*self._padded_size(
+                    [(round(frame_h * ratio), round(frame_w * ratio))]))
+
+    def _yolo_output_to_predictions(self,
+                                    results: List[torch.Tensor]) -> List[Prediction]:
+        """ Converts YOLOv5 xyxy detections to AIV Prediction """
         frames_predictions = []
 
-        for preds in results.xyxy:
+        for preds in results:
             frame_predictions = []
-            for pred in preds:
-                bbox_coords = pred[:4]
-                confidence_score = pred[4].item()
-                class_id = int(pred[5].item())
-                class_name = self.model.names[class_id]
-
-                x1, y1, x2, y2 = bbox_coords
-                x1 = x1.item()
-                y1 = y1.item()
-                x2 = x2.item()
-                y2 = y2.item()
+            # Single device->host copy per frame instead of one sync per value
+            preds = preds.detach().cpu().numpy()
+            for row in preds:
+                x1, y1, x2, y2 = (float(row[0]), float(row[1]),
+                                  float(row[2]), float(row[3]))
+                confidence_score = float(row[4])
+                class_id = int(row[5])
+                class_name = self._names[class_id]
 
                 bbox = Polygon(type="quadrilateral",
                                coordinates=[Point(x=x1, y=y1),
@@ -74,26 +159,213 @@ class YOLOv5():
 
         return frames_predictions
 
-    def _batch_to_cv2(self,
-                      batch: List[InferenceFrameData]) -> List[np.ndarray]:
-        imgs = []
-
-        for batch_dict in batch:
-            img_raw = batch_dict["frame"]
+    def _decode_frame(self, img_raw: bytes) -> torch.Tensor:
+        """ Decodes a single JPEG frame into a RGB uint8 CHW tensor """
+        img_data = torch.frombuffer(img_raw, dtype=torch.uint8)
+        try:
+            img = decode_jpeg(img_data, mode=ImageReadMode.RGB, device=DEVICE)
+        except RuntimeError:
             img_arr = np.frombuffer(img_raw, dtype=np.uint8)
             img = cv2.imdecode(img_arr, flags=cv2.IMREAD_COLOR)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = img.astype(float)
-            imgs.append(img)
+            # BGR HWC -> RGB CHW, flipping channels after the upload
+            img = self._upload(img).permute(2, 0, 1).flip(0)
+
+        return img
+
+    def _upload(self, img: np.ndarray) -> torch.Tensor:
+        """
+        Copies a host frame to DEVICE through the pinned staging buffer on the
+        copy stream, so the transfer overlaps the decoding of the next frame.
+        """
+        if self._copy_stream is None:
+            return torch.from_numpy(img)
+
+        # The staging buffer may still be read by the previous upload
+        if self._copy_done is not None:
+            self._copy_done.synchronize()
+
+        if self._pinned.numel() < img.nbytes:
+            self._pinned = torch.empty(img.nbytes, dtype=torch.uint8,
+                                       pin_memory=True)
+        staging = self._pinned[:img.nbytes].view(img.shape)
+        staging.copy_(torch.from_numpy(img))
 
-        return imgs
+        with torch.cuda.stream(self._copy_stream):
+            img = staging.to(DEVICE, non_blocking=True)
+            self._copy_done = torch.cuda.Event()
+            self._copy_done.record()
+
+        current_stream = torch.cuda.current_stream(DEVICE)
+        current_stream.wait_event(self._copy_done)
+        img.record_stream(current_stream)
+
+        return img
+
+    def _batch_to_cv2(self,
+                      batch: List[InferenceFrameData]) -> List[torch.Tensor]:
+        """
+        Decodes the JPEG frames of the batch into RGB uint8 CHW tensors.
+
+        Decoding is done by NVJPEG directly on DEVICE when available, falling
+        back to OpenCV on the host otherwise. On CUDA, recent torchvision
+        versions decode the whole batch in a single call. On the CPU, where
+        that call is a serial loop, frames are spread over the decode pool.
+        """
+        if BATCHED_DECODE and DEVICE.type == "cuda":
+            imgs_data = [torch.frombuffer(batch_dict["frame"], dtype=torch.uint8)
+                         for batch_dict in batch]
+            try:
+                return decode_jpeg(imgs_data,
+                                   mode=ImageReadMode.RGB,
+                                   device=DEVICE)
+            except RuntimeError:
+                # Any bad frame fails the whole call, decode them one by one
+                logging.warning("Batched JPEG decoding failed, decoding the "
+                                "%d frames one by one", len(batch),
+                                exc_info=True)
+
+        frames = [batch_dict["frame"] for batch_dict in batch]
+
+        if self._decode_pool is not None:
+            return list(self._decode_pool.map(self._decode_frame, frames))
+
+        return [self._decode_frame(frame) for frame in frames]
+
+    def _padded_size(self, shapes):
+        """ Smallest stride aligned h,w fitting all the resized h,w shapes """
+        batch_h = math.ceil(max(h for h, _ in shapes) / self.stride) * self.stride
+        batch_w = math.ceil(max(w for _, w in shapes) / self.stride) * self.stride
+
+        return batch_h, batch_w
+
+    def _letterbox(self, imgs: List[torch.Tensor]):
+        """
+        Resizes the RGB uint8 CHW images keeping their aspect ratio and pads
+        them into a single batch normalized to [0, 1], as AutoShape would.
+        Batches fitting the traced batch shape are padded to it, extra rows
+        are left blank. Without a frame_size, the first batch sets that shape.
+
+        Returns:
+            the (B, 3, H, W) batch in the inference dtype, the resize ratio
+            and the (left, top) padding of each image.
+        """
+        ratios = [self.img_size / max(img.shape[1:]) for img in imgs]
+        shapes = [(round(img.shape[1] * ratio), round(img.shape[2] * ratio))
+                  for img, ratio in zip(imgs, ratios)]
+        batch_h, batch_w = self._padded_size(shapes)
+
+        if self._batch_shape is None:
+            self._trace(batch_h, batch_w)
+
+        shape = (len(imgs), 3, batch_h, batch_w)
+        if self._traced is not None:
+            _, _, fixed_h, fixed_w = self._batch_shape
+            if (len(imgs) <= self.max_batch
+                    and batch_h <= fixed_h and batch_w <= fixed_w):
+                shape = self._batch_shape
+                _, _, batch_h, batch_w = shape
+
+        # The batch buffer is reused while the batch shape does not change
+        if self._batch_buf is None or tuple(self._batch_buf.shape) != shape:
+            self._batch_buf = torch.empty(
+                shape,
+                dtype=torch.float16 if self.half else torch.float32,
+                device=DEVICE)
+        x = self._batch_buf.fill_(114 / 255)
+        pads = []
+
+        for i, (img, (h, w)) in enumerate(zip(imgs, shapes)):
+            top = (batch_h - h) // 2
+            left = (batch_w - w) // 2
+            x[i, :, top:top + h, left:left + w] = F.interpolate(
+                img[None].float(), size=(h, w),
+                mode="bilinear", align_corners=False)[0].div_(255)
+            pads.append((left, top))
+
+        return x, ratios, pads
+
+    def _scale_boxes(self, preds: torch.Tensor, img: torch.Tensor,
+                     ratio: float, pad) -> torch.Tensor:
+        """ Maps xyxy boxes from the letterboxed batch back to the image """
+        left, top = pad
+        preds[:, [0, 2]] = ((preds[:, [0, 2]] - left) / ratio).clamp(0, img.shape[2])
+        preds[:, [1, 3]] = ((preds[:, [1, 3]] - top) / ratio).clamp(0, img.shape[1])
+
+        return preds
+
+    def _trace(self, batch_h: int, batch_w: int) -> None:
+        """
+        Traces the inner model with TorchScript for (max_batch, 3, batch_h,
+        batch_w) and warms it up, so cuDNN autotuning runs here too. YOLOv5
+        bakes the feature map grids into the trace, so other shapes run in
+        eager mode, as does everything if tracing fails.
+        """
+        self._batch_shape = (self.max_batch, 3, batch_h, batch_w)
+        x = torch.zeros(self._batch_shape,
+                        dtype=torch.float16 if self.half else torch.float32,
+                        device=DEVICE)
+        try:
+            self._traced = torch.jit.trace(self.inner, x,
+                                           strict=False,
+                                           check_trace=False)
+        except Exception:
+            logging.warning("TorchScript tracing failed for input shape %s, "
+                            "running in eager mode", self._batch_shape,
+                            exc_info=True)
+            return
+
+        for _ in range(3):
+            with torch.cuda.amp.autocast(enabled=self.half,
+                                         dtype=torch.float16):
+                self._forward(x)
+
+    def _forward(self, x: torch.Tensor):
+        """ Runs the inner model, through its trace for the fixed shape """
+        if self._traced is not None and tuple(x.shape) == self._batch_shape:
+            return self._traced(x)
+
+        return self.inner(x)
 
     def __call__(self,
                  batch: List[InferenceFrameData]) -> List[InferencePredictionData]:
-        imgs = self._batch_to_cv2(batch)
+        sampled = [(self._frame_count + i) % (self.frame_skip + 1) == 0
+                   for i in range(len(batch))]
+        self._frame_count += len(batch)
+
+        sampled_batch = [batch_dict for batch_dict, is_sampled
+                         in zip(batch, sampled) if is_sampled]
+        sampled_predictions = []
+
+        if sampled_batch:
+            with torch.inference_mode():
+                imgs = self._batch_to_cv2(sampled_batch)
+                x, ratios, pads = self._letterbox(imgs)
+
+                with torch.cuda.amp.autocast(enabled=self.half,
+                                             dtype=torch.float16):
+                    raw = self._forward(x)
+                results = self._nms(raw,
+                                    conf_thres=self.model.conf,
+                                    iou_thres=self.model.iou,
+                                    classes=self.model.classes,
+                                    agnostic=self.model.agnostic,
+                                    max_det=self.model.max_det)
+                results = [self._scale_boxes(preds, img, ratio, pad)
+                           for preds, img, ratio, pad
+                           in zip(results, imgs, ratios, pads)]
+                sampled_predictions = self._yolo_output_to_predictions(results)
+
+        sampled_predictions = iter(sampled_predictions)
+        frames_predictions = []
 
-        results = self.model(imgs, size=self.img_size)
-        frames_predictions = self._yolo_output_to_predictions(results)
+        for is_sampled in sampled:
+            if is_sampled:
+                self._last_predictions = next(sampled_predictions)
+                frames_predictions.append(self._last_predictions)
+            else:
+                # Own copy per frame, so downstream changes (e.g. a tracker
+                # setting trackId) don't leak into other frames
+                frames_predictions.append(copy.deepcopy(self._last_predictions))
 
         predictions_data = []
 
@@ -0,0 +1,60 @@
+import numpy as np
+from numba import njit
+
+
+# Explicit signatures compile the kernels at import, not on the first frame
+@njit("b1[:](f8[:], f8[:], f8[:], f8[:])", cache=True)
+def points_in_polygon(px, py, poly_x, poly_y):
+    """
+    Crossing number test of the points (px, py) against the polygon given by
+    its vertices (poly_x, poly_y). Points on the boundary are outside, as
+    with shapely's Polygon.contains.
+
+    Returns:
+        np.ndarray: bool mask, True for points inside the polygon.
+    """
+    num_vertices = poly_x.shape[0]
+    inside = np.zeros(px.shape[0], dtype=np.bool_)
+
+    for i in range(px.shape[0]):
+        j = num_vertices - 1
+        for k in range(num_vertices):
+            # Points lying on an edge are on the boundary
+            if (min(poly_x[j], poly_x[k]) <= px[i] <= max(poly_x[j], poly_x[k])
+                    and min(poly_y[j], poly_y[k]) <= py[i] <= max(poly_y[j], poly_y[k])
+                    and ((poly_x[k] - poly_x[j]) * (py[i] - poly_y[j])
+                         == (poly_y[k] - poly_y[j]) * (px[i] - poly_x[j]))):
+                inside[i] = False
+                break
+
+            # Edges that straddle the horizontal ray cast from the point
+            if (poly_y[k] > py[i]) != (poly_y[j] > py[i]):
+                x_cross = (poly_x[k] + (py[i] - poly_y[k])
+                           * (poly_x[j] - poly_x[k]) / (poly_y[j] - poly_y[k]))
+                if px[i] < x_cross:
+                    inside[i] = not inside[i]
+            j = k
+
+    return inside
+
+
+@njit("b1[:](f8[:], f8[:], f8[:], f8[:], f8[:], f8[:])", cache=True)
+def occupancy(cx, cy, x1, x2, y1, y2):
+    """
+    Checks the chairs medium points (cx, cy) against the bboxes given by
+    (x1, x2, y1, y2). A chair is occupied when its point is outside of
+    every bbox, as the chair is hidden by whoever sits on it.
+
+    Returns:
+        np.ndarray: bool mask, True for occupied chairs.
+    """
+    occupied = np.ones(cx.shape[0], dtype=np.bool_)
+
+    for i in range(cx.shape[0]):
+        for j in range(x1.shape[0]):
+            if (cx[i] >= x1[j] and cx[i] <= x2[j]
+                    and cy[i] >= y1[j] and cy[i] <= y2[j]):
+                occupied[i] = False
+                break
+
+    return occupied
@@ -1,9 +1,11 @@
 import time
+import numpy as np
 from uuid import uuid4
-from typing import Union, List
+from typing import Union, List, Dict
 from eventfactory import Detection
 from eventfactory import EventEndedSignal, EventStartedSignal
 from eventfactory.pipeline.steps import BusinessLogic
+from ._kernels import occupancy
 
 
 class Event():
@@ -85,18 +87,14 @@ class RoIBusinessLogic(BusinessLogic):
     _calculate_medium_point(self, chair) -> dict:
         Returns the medium point of an object detected by the AI.
         
-    _create_chair_map(self, detection : Detection) -> List[List[dict]]:
-        Returns a matrix with the medium points of the chairs mapping all 
+    _create_chair_map(self, detection : Detection) -> Dict[str, np.ndarray]:
+        Returns the medium points of the chairs as arrays, mapping all 
         the chairs in their respective lines.
         
     _check_chair_map(self, detection) -> bool:
-        Check if any of the chairs in the _chair_map matrix need to change
+        Check if any of the chairs in the _chair_map need to change
         state and returns if any chair has changed estate.
         
-    _check_chair_occupied(self, line : int, column : int, detection : Detection) -> bool:
-        Checks if an especific chair needs to change state or not, and returns a bool
-        telling if the chair changed states.
-        
     _create_event(self, detection: Detection) -> List[Union[EventStartedSignal, EventEndedSignal]]:
         Returns a list with the starter and the ender of the same event
         so that the event starts and ends in the same frame.
@@ -104,7 +102,7 @@ class RoIBusinessLogic(BusinessLogic):
 
     def __init__(self):
         self._chair_count = 0
-        self._chair_map = []
+        self._chair_map = {}
     
     def _add_count(self) -> dict:
         """
@@ -116,11 +114,7 @@ class RoIBusinessLogic(BusinessLogic):
             same attributes as one.
             
         """
-        occupied_chairs = 0
-        for line in self._chair_map:
-            for chair in line:
-                if chair['occupied']:
-                    occupied_chairs += 1
+        occupied_chairs = int(self._chair_map['occupied'].sum())
                     
         return {'classId': f'Total de caideras: {self._chair_count} | Cadeiras ocupadas: {occupied_chairs} | Cadeiras livres: {self._chair_count - occupied_chairs}', 
                  'trackId': '', 
@@ -171,12 +165,13 @@ class RoIBusinessLogic(BusinessLogic):
         
         detection['predictions'].append(self._add_count())
         
-        for i in range(0,len(self._chair_map)):
-            for point in self._chair_map[i]:
-                if point['occupied']:
-                    detection['predictions'].append(self._create_point(point,f"M{i}(ocupado)"))
-                else:
-                    detection['predictions'].append(self._create_point(point,f"M{i}(livre)"))
+        detection['predictions'].extend(
+            self._create_point({'x': float(x), 'y': float(y)},
+                               f"M{line}(ocupado)" if occupied else f"M{line}(livre)")
+            for x, y, occupied, line in zip(self._chair_map['x'],
+                                            self._chair_map['y'],
+                                            self._chair_map['occupied'],
+                                            self._chair_map['line']))
                     
         return detection
     
@@ -196,19 +191,21 @@ class RoIBusinessLogic(BusinessLogic):
                 'y' : (((chair['boundingBox']['coordinates'][2]['y'] - chair['boundingBox']['coordinates'][1]['y'])/2) +  chair['boundingBox']['coordinates'][1]['y'])}
         
                 
-    def _create_chair_map(self, detection : Detection) -> List[List[dict]]:
+    def _create_chair_map(self, detection : Detection) -> Dict[str, np.ndarray]:
         """
         Creates a matrix of all the chairs in the detection.
         This method is only supposed to be run once on the first frame.
-        This methods works by using a chair for reference in a line
-        assuming that with a marging of error every other chair medium
-        point that is in that line should have that height.
-        If it detects a chair that is way to high or low, it uses
-        that chair as a reference for another line of chairs.
+        This methods works by sweeping the chairs sorted by height and
+        using the first chair of a line as reference, assuming that with
+        a marging of error every other chair medium point that is in that
+        line should have that height.
+        If it finds a chair that is way to low, it uses that chair as a
+        reference for another line of chairs.
         It filter lines of chairs that has only 4 assuming that
         they are probably an erorr commited by the ai.
-        The matrix it returns will be used as the reference map
-        for all the other frames.
+        The map it returns will be used as the reference map
+        for all the other frames, stored as one array per attribute
+        ('x', 'y', 'occupied' and 'line') indexed by chair.
         
         Parameters:
         -----------
@@ -216,29 +213,21 @@ class RoIBusinessLogic(BusinessLogic):
             about the objects detected in a video frame.
 
         Returns:
-            List[Union[List[Union[Detection]]]]: with the matrix.
+            Dict[str, np.ndarray]: with the chair map.
         """
+        points = np.array([[point['x'], point['y']] for point in
+                           map(self._calculate_medium_point,
+                               detection['predictions'])],
+                          dtype=float).reshape(-1, 2)
+
         matrix_chairs = []
-        main_chairs = []
-        for chair in detection['predictions']:
-            chair = self._calculate_medium_point(chair)
-            chair.update({'occupied' : False})
+        main_chair_y = None
+        for x, y in points[np.argsort(points[:, 1], kind='stable')]:
+            if main_chair_y is None or abs(y - main_chair_y) >= 55:
+                main_chair_y = y
+                matrix_chairs.append([])
 
-            added = False
-            
-            if not main_chairs:
-                main_chairs.append(chair)
-                matrix_chairs.append([chair])
-                continue
-
-            for i in range(0,len(main_chairs)):
-                if chair['y'] < (main_chairs[i]['y'] + 55) and chair['y'] > (main_chairs[i]['y'] - 55):
-                    matrix_chairs[i].append(chair)
-                    added = True
-                
-            if not added:
-                matrix_chairs.append([chair])
-                main_chairs.append(chair)
+            matrix_chairs[-1].append({'x': x, 'y': y})
 
         remove = []
         for i in range(0,len(matrix_chairs)):
@@ -248,11 +237,20 @@ class RoIBusinessLogic(BusinessLogic):
         for i in remove:
             matrix_chairs.pop(i)
             
-        return matrix_chairs
+        chairs = [(chair['x'], chair['y'], i)
+                  for i, line in enumerate(matrix_chairs)
+                  for chair in line]
+        
+        return {'x': np.array([chair[0] for chair in chairs], dtype=float),
+                'y': np.array([chair[1] for chair in chairs], dtype=float),
+                'occupied': np.zeros(len(chairs), dtype=bool),
+                'line': np.array([chair[2] for chair in chairs], dtype=int)}
 
     def _check_chair_map(self, detection) -> bool:
         """
-        Check the whole matrix map to see if a chair changed states.
+        Check the whole map to see if a chair changed states.
+        A chair is free while its medium point is inside the bbox of any
+        prediction made by the ai, and occupied otherwise.
 
         Parameters:
         -----------
@@ -263,50 +261,28 @@ class RoIBusinessLogic(BusinessLogic):
             bool : it returns a bool telling if the state of any of the chairs
             changed.
         """
-        changed = False
-        for i in range(0, len(self._chair_map)):
-            for j in range (0, len(self._chair_map[i])):
-                if self._check_chair_occupied(i, j, detection):
-                    changed = True
+        if not detection['predictions']:
+            # Without any prediction every chair is hidden, so no need to
+            # check each one against the bboxes
+            changed = not self._chair_map['occupied'].all()
+            self._chair_map['occupied'][:] = True
             
-        return changed
-    
-    def _check_chair_occupied(self, line : int, column : int, detection : Detection) -> bool:
-        """
-        Check if the specific is occupied or not by checking every prediction made
-        by the ai and seeing if the medium point of the chair is inside any of the
-        squares.
-
-        Parameters:
-        -----------
-            detection (Detection): A Detection object containing information
-            about the objects detected in a video frame.
-            line (int): the line the chair is in the matrix.
-            chair (int): the column the chair is in the matrix.
-
-        Returns:
-            bool : it returns a bool telling if the state of the chair was changed
-            or not.
-        """
-        changed = False
-        for pred in detection['predictions']:
+            return changed
+        
+        bboxes = np.array([[pred['boundingBox']['coordinates'][0]['x'],
+                            pred['boundingBox']['coordinates'][1]['x'],
+                            pred['boundingBox']['coordinates'][1]['y'],
+                            pred['boundingBox']['coordinates'][2]['y']]
+                           for pred in detection['predictions']],
+                          dtype=float).reshape(-1, 4)
+        x1, x2, y1, y2 = np.ascontiguousarray(bboxes.T)
+        occupied = occupancy(self._chair_map['x'], self._chair_map['y'],
+                             x1, x2, y1, y2)
+
+        changed = bool(np.any(occupied != self._chair_map['occupied']))
+        self._chair_map['occupied'] = occupied
             
-            if self._chair_map[line][column]['x'] >= pred['boundingBox']['coordinates'][0]['x'] and self._chair_map[line][column]['x'] <= pred['boundingBox']['coordinates'][1]['x']:
-                
-                if self._chair_map[line][column]['y'] >= pred['boundingBox']['coordinates'][1]['y'] and self._chair_map[line][column]['y'] <= pred['boundingBox']['coordinates'][2]['y']:
-                    
-                    if not self._chair_map[line][column]['occupied']:
-                        return False
-                    else:
-                        self._chair_map[line][column]['occupied'] = False
-                        return True
-    
-    
-        if self._chair_map[line][column]['occupied']:
-            return False
-        else:
-            self._chair_map[line][column]['occupied'] = True
-            return True
+        return changed
             
     
     def _create_event(self, detection: Detection) -> List[Union[EventStartedSignal, EventEndedSignal]]:
@@ -345,11 +321,9 @@ class RoIBusinessLogic(BusinessLogic):
             either the EventStartedSignal or EventEndedSignal class.
         """
         events = []
-        if not self._chair_map:
+        if not self._chair_count:
             self._chair_map = self._create_chair_map(detection)
-            
-            for lines in self._chair_map:
-                self._chair_count += len(lines)
+            self._chair_count = len(self._chair_map['x'])
             
             detection = self._insert_info(detection)
             
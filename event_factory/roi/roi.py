@@ -1,39 +1,53 @@
 from typing import List
+import numpy as np
 from eventfactory import Detection, PipelineStep
-from shapely import geometry
-from shapely.geometry import polygon
+from ._kernels import points_in_polygon
 
 
 class RegionOfInterest(PipelineStep):
     def __init__(self, region: List) -> None:
         self._region = region
 
+        self._poly_xs = np.array([point['x'] for point in region], dtype=float)
+        self._poly_ys = np.array([point['y'] for point in region], dtype=float)
+
+        self._min_x, self._max_x = self._poly_xs.min(), self._poly_xs.max()
+        self._min_y, self._max_y = self._poly_ys.min(), self._poly_ys.max()
+
     def process(self, detection: Detection) -> Detection:
-        predictions = filter(self.__pred_is_inside_region,
-                             detection["predictions"])
+        predictions = detection["predictions"]
 
-        detection['predictions'] = list(predictions)
+        inside = self.__preds_are_inside_region(predictions)
+
+        detection['predictions'] = [pred for pred, is_inside
+                                    in zip(predictions, inside) if is_inside]
 
         return detection
 
-    def __pred_is_inside_region(self, prediction):
+    def __preds_are_inside_region(self, predictions) -> np.ndarray:
         """
-        Checks whether a given prediction is inside the ROI.
+        Checks whether each given prediction is inside the ROI.
 
         This verification is intended to be used when detection people, as
         we consider the medium point of the base of the predicted bbox to be
-        their feet.
+        their feet. Predictions outside of the bounding box of the ROI are
+        rejected first, only the remaining ones are ray casted.
         """
-        bbox_coord = prediction['boundingBox']['coordinates']
+        if not predictions:
+            return np.zeros(0, dtype=bool)
+
+        coords = np.array([[(point['x'], point['y'])
+                            for point in pred['boundingBox']['coordinates']]
+                           for pred in predictions],
+                          dtype=float).reshape(len(predictions), -1, 2)
 
-        bbox_x_min = min([point['x'] for point in bbox_coord])
-        bbox_x_max = max([point['x'] for point in bbox_coord])
-        bbox_y_max = max([point['y'] for point in bbox_coord])
+        x_mean = (coords[:, :, 0].min(1) + coords[:, :, 0].max(1)) // 2
+        person_foot = coords[:, :, 1].max(1)
 
-        x_mean = (bbox_x_min + bbox_x_max) // 2
-        person_foot = geometry.Point(x_mean, bbox_y_max)
+        inside = ((x_mean >= self._min_x) & (x_mean <= self._max_x) &
+                  (person_foot >= self._min_y) & (person_foot <= self._max_y))
 
-        polygon_points = [(point['x'], point['y']) for point in self._region]
-        region_polygon = polygon.Polygon(polygon_points)
+        inside[inside] = points_in_polygon(x_mean[inside], person_foot[inside],
+                                           self._poly_xs, self._poly_ys)
 
-        return region_polygon.contains(person_foot)
+        return inside
@@ -0,0 +1,30 @@
+import sys
+import types
+
+try:
+    import eventfactory  # noqa: F401
+except ImportError:
+    # aiv-event-factory comes from a private index, the pipeline steps only
+    # need its base classes and signals
+    class _Signal():
+        def __init__(self, event_id, detection):
+            self.event_id = event_id
+            self.detection = detection
+
+    eventfactory = types.ModuleType("eventfactory")
+    pipeline = types.ModuleType("eventfactory.pipeline")
+    steps = types.ModuleType("eventfactory.pipeline.steps")
+
+    for module in (eventfactory, pipeline):
+        module.Detection = dict
+        module.EventStartedSignal = type("EventStartedSignal", (_Signal,), {})
+        module.EventEndedSignal = type("EventEndedSignal", (_Signal,), {})
+    eventfactory.PipelineStep = object
+    pipeline.EventPipeline = object
+    steps.BusinessLogic = object
+
+    eventfactory.pipeline = pipeline
+    pipeline.steps = steps
+    sys.modules["eventfactory"] = eventfactory
+    sys.modules["eventfactory.pipeline"] = pipeline
+    sys.modules["eventfactory.pipeline.steps"] = steps
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from roi.business_logic import RoIBusinessLogic
+
+
+def _chair(x, y, size=20):
+    """ Chair prediction whose medium point is (x, y) """
+    half = size / 2
+    return {'classId': 'chair',
+            'trackId': '',
+            'confidence': 0.9,
+            'boundingBox': {'type': 'quadrilateral',
+                            'coordinates': [{'x': x - half, 'y': y - half},
+                                            {'x': x + half, 'y': y - half},
+                                            {'x': x + half, 'y': y + half},
+                                            {'x': x - half, 'y': y + half}]},
+            'related': []}
+
+
+def _row(y, num_chairs, dy=0):
+    return [_chair(100 + 50 * i, y + dy * i) for i in range(num_chairs)]
+
+
+def test_rows_grouped_and_numbered_top_to_bottom():
+    # Bottom row first, slightly tilted rows within the 55px band
+    predictions = _row(400, 6, dy=5) + _row(100, 5, dy=-5)
+
+    chair_map = RoIBusinessLogic()._create_chair_map({'predictions': predictions})
+
+    assert chair_map['line'].tolist() == [0] * 5 + [1] * 6
+    assert (chair_map['y'][:5] < 200).all()
+    assert (chair_map['y'][5:] > 300).all()
+    assert not chair_map['occupied'].any()
+
+
+def test_rows_with_four_chairs_or_less_are_dropped():
+    predictions = _row(100, 5) + _row(300, 4) + _row(500, 1)
+
+    chair_map = RoIBusinessLogic()._create_chair_map({'predictions': predictions})
+
+    assert chair_map['line'].tolist() == [0] * 5
+    assert (chair_map['y'] == 100).all()
+
+
+def test_chair_between_rows_is_assigned_once():
+    # 130 is within 55px of both the 100 and the 160 rows
+    predictions = _row(100, 5) + _row(160, 5) + [_chair(400, 130)]
+
+    chair_map = RoIBusinessLogic()._create_chair_map({'predictions': predictions})
+
+    points = list(zip(chair_map['x'].tolist(), chair_map['y'].tolist()))
+    assert len(points) == 11
+    assert len(set(points)) == 11
+    assert chair_map['line'].tolist() == [0] * 6 + [1] * 5
+
+
+def test_empty_predictions_occupy_every_chair():
+    logic = RoIBusinessLogic()
+    chairs = _row(100, 5) + _row(300, 5)
+    logic.process({'predictions': list(chairs)})
+
+    assert logic._chair_count == 10
+    assert not logic._chair_map['occupied'].any()
+
+    # Half of the chairs hidden
+    assert logic._check_chair_map({'predictions': chairs[:5]})
+    assert logic._chair_map['occupied'].tolist() == [False] * 5 + [True] * 5
+
+    assert logic._check_chair_map({'predictions': []})
+    assert logic._chair_map['occupied'].all()
+
+    assert not logic._check_chair_map({'predictions': []})
+    assert logic._chair_map['occupied'].all()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+shapely_geometry = pytest.importorskip("shapely.geometry")
+
+from roi._kernels import points_in_polygon, occupancy
+
+
+def _random_polygon(rng, num_vertices):
+    # Vertices sorted by angle around a center give a simple polygon
+    angles = np.sort(rng.uniform(0, 2 * np.pi, num_vertices))
+    radius = rng.uniform(50, 300, num_vertices)
+    center = rng.uniform(200, 800, 2)
+
+    return (center[0] + radius * np.cos(angles),
+            center[1] + radius * np.sin(angles))
+
+
+def test_points_in_polygon_matches_shapely():
+    rng = np.random.default_rng(0)
+
+    for _ in range(300):
+        poly_x, poly_y = _random_polygon(rng, rng.integers(3, 12))
+        region = shapely_geometry.Polygon(list(zip(poly_x, poly_y)))
+        px = rng.uniform(0, 1100, 50)
+        py = rng.uniform(0, 1100, 50)
+
+        expected = [region.contains(shapely_geometry.Point(x, y))
+                    for x, y in zip(px, py)]
+
+        np.testing.assert_array_equal(
+            points_in_polygon(px, py, poly_x, poly_y), expected)
+
+
+def test_points_in_polygon_excludes_boundary():
+    # Integer vertices and floor divided foot points do land on the boundary
+    poly_x = np.array([0.0, 10.0, 10.0, 4.0, 0.0])
+    poly_y = np.array([0.0, 0.0, 10.0, 14.0, 10.0])
+    region = shapely_geometry.Polygon(list(zip(poly_x, poly_y)))
+    points = [(0, 5), (10, 5), (5, 0), (7, 12), (2, 12), (0, 0), (10, 10),
+              (4, 14), (5, 5), (4, 13), (11, 5), (5, -1)]
+    px = np.array([x for x, _ in points], dtype=float)
+    py = np.array([y for _, y in points], dtype=float)
+
+    expected = [region.contains(shapely_geometry.Point(x, y))
+                for x, y in points]
+
+    assert expected == [False] * 8 + [True, True, False, False]
+    np.testing.assert_array_equal(
+        points_in_polygon(px, py, poly_x, poly_y), expected)
+
+
+def test_points_in_polygon_empty():
+    poly_x = np.array([0.0, 10.0, 10.0, 0.0])
+    poly_y = np.array([0.0, 0.0, 10.0, 10.0])
+
+    assert points_in_polygon(np.zeros(0), np.zeros(0), poly_x, poly_y).shape == (0,)
+
+
+def _occupancy_loop(cx, cy, bboxes):
+    """ Per chair, per prediction check the business logic used to do """
+    occupied = []
+    for x, y in zip(cx, cy):
+        occupied.append(not any(x1 <= x <= x2 and y1 <= y <= y2
+                                for x1, x2, y1, y2 in bboxes))
+
+    return occupied
+
+
+def test_occupancy_matches_loop():
+    rng = np.random.default_rng(0)
+
+    for _ in range(200):
+        cx = rng.uniform(0, 1000, rng.integers(1, 60))
+        cy = rng.uniform(0, 1000, cx.shape[0])
+        x1 = rng.uniform(0, 1000, rng.integers(0, 40))
+        y1 = rng.uniform(0, 1000, x1.shape[0])
+        x2 = x1 + rng.uniform(0, 200, x1.shape[0])
+        y2 = y1 + rng.uniform(0, 200, x1.shape[0])
+
+        expected = _occupancy_loop(cx, cy, list(zip(x1, x2, y1, y2)))
+
+        np.testing.assert_array_equal(
+            occupancy(cx, cy, x1, x2, y1, y2), expected)